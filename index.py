@@ -1,22 +1,83 @@
 import os
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import hashlib
+import json
+import re
+import logging
+import logging.handlers
+import queue
+import atexit
+import zipfile
+import xml.etree.ElementTree as ET
+import httpx
 import streamlit as st
 import fitz  # PyMuPDF
 import pptx
 import openpyxl
 import docx
 import requests
-import re
-import logging
+from requests.adapters import HTTPAdapter, Retry
+import diskcache
+
+try:
+    # Rust-backed spreadsheet parser; far faster than openpyxl's
+    # per-cell object model on large workbooks.
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+try:
+    # Tokenizer for truncating summary content on token boundaries rather
+    # than a rough character count.
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+try:
+    # Rust-backed JSON codec; faster than stdlib json on the string-heavy
+    # payloads the scan loop builds and the responses it parses.
+    import orjson
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj)
+
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
+    _json_loads = json.loads
 
 # Configure logging to save to file AND console
-logging.basicConfig(
-    level=logging.DEBUG, 
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log'),  # Save to app.log file
-        logging.StreamHandler()  # Also show in console
-    ]
-)
+@st.cache_resource
+def _setup_logging():
+    """
+    Route all records through a queue so logger calls in hot paths just
+    enqueue; formatting and the file/console writes happen on a dedicated
+    listener thread instead of blocking the caller on disk I/O.
+    """
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    file_handler = logging.FileHandler('app.log')  # Save to app.log file
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()  # Also show in console
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG)
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    return listener
+
+
+_setup_logging()
 logger = logging.getLogger(__name__)
 
 # --- Example Usage and Logging Demo ---
@@ -165,16 +226,50 @@ logger.debug("API response received successfully")
 
 # --- Core AI and File Handling Functions ---
 
-def make_api_call(api_key, prompt, model="gemini-2.0-flash"):
+@st.cache_resource
+def _gemini_session():
     """
-    Generic function to make a call to the Gemini API.
-    Handles the request and response logic.
+    One shared requests.Session for all Gemini calls.
+    Keep-alive reuses a single TLS connection instead of re-handshaking
+    per request, and the adapter retries transient 429/5xx responses.
     """
-    if not api_key:
-        return "[Error: API key not provided]"
+    session = requests.Session()
+    session.headers.update({'Content-Type': 'application/json'})
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        # urllib3 won't retry POST by default; these generateContent calls
+        # are safe to repeat on 429/5xx, so allow it explicitly.
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=frozenset({"POST"}))
+    )
+    session.mount('https://', adapter)
+    return session
+
+
+@st.cache_resource
+def _summary_cache():
+    """
+    Disk-backed cache of per-file summaries, keyed by path + mtime + size.
+    Unchanged files skip the Gemini call entirely on a rescan, and the
+    cache survives app restarts.
+    """
+    return diskcache.Cache(".summary_cache")
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
-    
+
+def _summary_cache_key(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return hashlib.sha1(f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}".encode()).hexdigest()
+
+
+def _gemini_url(api_key, model):
+    return f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={api_key}"
+
+
+def _gemini_payload(prompt, json_response=False):
     payload = {
         "contents": [{"parts": [{"text": prompt}]}],
         "generationConfig": {
@@ -183,65 +278,408 @@ def make_api_call(api_key, prompt, model="gemini-2.0-flash"):
             "maxOutputTokens": 2048,
         }
     }
-    
-    headers = {'Content-Type': 'application/json'}
+    if json_response:
+        payload["generationConfig"]["responseMimeType"] = "application/json"
+        # A batched response carries up to _BATCH_MAX_FILES summaries plus
+        # JSON scaffolding; the single-summary cap would truncate it
+        # mid-JSON and waste the whole batch. 8192 is the model's output
+        # ceiling and comfortably fits a full batch.
+        payload["generationConfig"]["maxOutputTokens"] = 8192
+    return payload
+
+
+# Cap on simultaneous Gemini requests so a big scan stays under the
+# provider's rate limit instead of burning wall time on 429 backoff.
+_DEFAULT_API_CONCURRENCY = 6
+_API_SEM = threading.Semaphore(_DEFAULT_API_CONCURRENCY)
 
+
+def _parse_gemini_response(result):
+    if (candidates := result.get('candidates')) and (parts := candidates[0].get('content', {}).get('parts')):
+        return parts[0].get('text', '[Could not extract text from response]').strip()
+    else:
+        return f"[API Error: Unexpected response format. Response: {result}]"
+
+
+# Cap on the chat replay cache below, mirroring the old st.cache_data limit
+_CHAT_CACHE_MAX_ENTRIES = 1024
+
+
+@st.cache_resource
+def _chat_response_cache():
+    """
+    Replay cache for completed chat responses keyed by (api_key, prompt).
+    Streaming can't go through st.cache_data, so finished streams are
+    recorded here and an identical prompt renders instantly instead of
+    re-hitting the API.
+    """
+    return {}
+
+
+def make_api_call_stream(api_key, prompt, model="gemini-2.0-flash", status=None):
+    """
+    Stream a Gemini response via the SSE endpoint, yielding text chunks as
+    they arrive so the chat UI can render tokens incrementally instead of
+    waiting for the full response.
+
+    `status`, if given, is a dict whose 'failed' key is set when the stream
+    errors. A stream can die after chunks were already yielded, so callers
+    that care whether the answer is complete must check the flag rather
+    than the assembled text.
+    """
+    if status is None:
+        status = {}
+    status['failed'] = False
+    if not api_key:
+        status['failed'] = True
+        yield "[Error: API key not provided]"
+        return
+
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent?alt=sse&key={api_key}"
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=120)
-        response.raise_for_status()
-        result = response.json()
-        
-        if (candidates := result.get('candidates')) and (parts := candidates[0].get('content', {}).get('parts')):
-            return parts[0].get('text', '[Could not extract text from response]').strip()
-        else:
-            return f"[API Error: Unexpected response format. Response: {result}]"
+        with _API_SEM:
+            response = _gemini_session().post(url, data=_json_dumps(_gemini_payload(prompt)), stream=True, timeout=120)
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith(b'data: '):
+                    continue
+                try:
+                    chunk = _json_loads(line[6:])
+                except ValueError:
+                    continue
+                if (candidates := chunk.get('candidates')) and (parts := candidates[0].get('content', {}).get('parts')):
+                    if text := parts[0].get('text'):
+                        yield text
 
     except requests.exceptions.RequestException as e:
+        status['failed'] = True
+        yield f"[API Request Error: {e}]"
+
+
+async def make_api_call_async(client, api_key, prompt, model="gemini-2.0-flash", json_response=False):
+    """
+    Make a Gemini call from the async scan loop, sharing one
+    httpx.AsyncClient so all in-flight summaries reuse its connection pool.
+    """
+    if not api_key:
+        return "[Error: API key not provided]"
+
+    try:
+        response = await client.post(
+            _gemini_url(api_key, model),
+            content=_json_dumps(_gemini_payload(prompt, json_response)),
+            headers={'Content-Type': 'application/json'},
+            timeout=120,
+        )
+        response.raise_for_status()
+        return _parse_gemini_response(_json_loads(response.content))
+
+    except (httpx.HTTPError, ValueError) as e:
+        # ValueError covers a 200 response whose body isn't valid JSON;
+        # one bad response should cost one file, not abort the scan
         return f"[API Request Error: {e}]"
     except (KeyError, IndexError):
         return "[API Error: Could not parse the summary from the API response]"
 
 
-def get_file_content(file_path, full_content=False):
+# Combined content budget (chars) and file cap per batched summary request.
+_BATCH_BUDGET = 12 * 1024
+_BATCH_MAX_FILES = 6
+
+
+def _batch_small_files(items):
     """
-    Extracts text content from various file types.
-    Can be limited for initial summary or read fully for Q&A.
+    Greedily group scan items whose combined content fits the batch budget
+    so several small files share one API request. Items too large to batch
+    are returned separately for individual requests.
+    """
+    batches, singles = [], []
+    current, current_size = [], 0
+    for item in items:
+        size = len(item[2])
+        if size > _BATCH_BUDGET:
+            singles.append(item)
+            continue
+        if current and (current_size + size > _BATCH_BUDGET or len(current) >= _BATCH_MAX_FILES):
+            # A group of one gains nothing from the JSON-mapping prompt;
+            # send it as a plain single request instead
+            if len(current) == 1:
+                singles.append(current[0])
+            else:
+                batches.append(current)
+            current, current_size = [], 0
+        current.append(item)
+        current_size += size
+    if len(current) == 1:
+        singles.append(current[0])
+    elif current:
+        batches.append(current)
+    return batches, singles
+
+
+def _batch_prompt(batch):
+    sections = "\n---\n".join(f"FILE: {file_name}\n{content}" for file_name, _, content, _ in batch)
+    return ("Return a JSON object mapping each filename to a concise, one-paragraph summary "
+            "of that file's main purpose and key topics.\n\nFiles:\n---\n" + sections)
+
+
+def _build_mention_re(file_names):
+    """
+    One alternation regex matching any scanned filename, compiled once per
+    scan instead of one regex per file per chat turn.
+    """
+    return re.compile(r'\b(' + '|'.join(re.escape(name) for name in file_names) + r')\b', re.IGNORECASE)
+
+
+def _build_mention_index(file_names):
+    """
+    Lowercase filename -> original-name map, plus the subset of names the
+    token prefilter can't see because they contain characters outside the
+    token alphabet (e.g. spaces); those need a substring check instead.
+    """
+    lower = {name.lower(): name for name in file_names}
+    multi = [name for name in lower if not re.fullmatch(r'[\w.\-]+', name)]
+    return lower, multi
+
+
+def _iter_supported(root, exts):
+    """
+    Yield (path, name) for every supported file under root. Iterative
+    os.scandir keeps the DirEntry type info from the directory read, so
+    no extra stat call per file. As with os.walk, directories that can't
+    be read (permissions, deleted mid-traversal) are skipped, symlinked
+    files are listed, and symlinked directories are not followed.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        if os.path.splitext(entry.name)[1].lower() in exts:
+                            yield entry.path, entry.name
+        except OSError:
+            continue
+
+
+# Summary mode truncates extracted text to this many characters, so
+# extraction loops can stop as soon as they have collected this much.
+_SUMMARY_CHAR_LIMIT = 15000
+
+
+# Plain-text extraction flags, pinned explicitly: keep whitespace and
+# ligatures as extracted and clip text to the page mediabox so off-page or
+# cropped text stays out of summaries. Dehyphenation and the positional
+# sort are left off (their defaults) - the text feeds an LLM prompt, so
+# no layout reconstruction is wanted.
+_PDF_TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_MEDIABOX_CLIP
+
+
+def _page_text(page):
+    return page.get_text("text", flags=_PDF_TEXT_FLAGS, sort=False)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def discover_files(root, exts):
+    """
+    Walk the tree once and reuse the result for a minute, so pressing the
+    scan button twice on the same directory doesn't pay for a second full
+    traversal on slow or network-mounted filesystems.
+    """
+    return list(_iter_supported(root, frozenset(exts)))
+
+
+def _extract_pdf_pages(file_path, lo, hi):
+    """Extract text from pages [lo, hi) of a PDF. Runs in a worker process."""
+    with fitz.open(file_path) as doc:
+        return "".join(_page_text(doc[i]) for i in range(lo, hi))
+
+
+# Small PDFs are extracted inline; above this page count the fork overhead
+# of a worker pool pays for itself.
+_PDF_PARALLEL_THRESHOLD = 32
+
+
+def _extract_pdf(file_path, limit=None):
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+        if limit is not None:
+            # Summary mode: stop reading pages once the truncation
+            # boundary is reached instead of extracting the whole doc.
+            parts, length = [], 0
+            for page in doc:
+                text = _page_text(page)
+                parts.append(text)
+                length += len(text)
+                if length >= limit:
+                    break
+            return "".join(parts)
+        # Spawn-based workers (Windows/macOS) re-import this module to find
+        # _extract_pdf_pages, which doesn't work for a Streamlit-run script,
+        # so the pool path is fork-only; everyone else extracts inline.
+        if page_count <= _PDF_PARALLEL_THRESHOLD or multiprocessing.get_start_method() != "fork":
+            return "".join(_page_text(page) for page in doc)
+
+    # Split the page range into one slice per worker; each worker opens
+    # its own handle on the document (fitz objects don't pickle).
+    workers = min(os.cpu_count() or 1, 4)
+    bounds = [round(page_count * i / workers) for i in range(workers + 1)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = pool.map(_extract_pdf_pages, [file_path] * workers, bounds[:-1], bounds[1:])
+    return "".join(chunks)
+
+
+# DrawingML text-run tag inside slide XML
+_DRAWINGML_T = '{http://schemas.openxmlformats.org/drawingml/2006/main}t'
+
+
+def _extract_pptx(file_path, limit=None):
+    """
+    Stream text nodes straight out of the slide XML in the pptx archive
+    instead of building python-pptx's full shape object model. Falls back
+    to python-pptx for decks the streaming parser can't handle.
+    """
+    try:
+        parts, length = [], 0
+        with zipfile.ZipFile(file_path) as archive:
+            slide_names = sorted(
+                (name for name in archive.namelist()
+                 if name.startswith('ppt/slides/slide') and name.endswith('.xml')),
+                key=lambda name: int(re.search(r'(\d+)\.xml$', name).group(1))
+            )
+            for slide_name in slide_names:
+                with archive.open(slide_name) as f:
+                    for _, element in ET.iterparse(f, events=('end',)):
+                        if element.tag == _DRAWINGML_T and element.text:
+                            parts.append(element.text)
+                            length += len(element.text) + 1
+                        element.clear()
+                if limit is not None and length >= limit:
+                    break
+        return "\n".join(parts)
+    except (zipfile.BadZipFile, ET.ParseError, KeyError, AttributeError):
+        prs = pptx.Presentation(file_path)
+        parts, length = [], 0
+        for slide in prs.slides:
+            for shape in slide.shapes:
+                if hasattr(shape, "text"):
+                    parts.append(shape.text)
+                    length += len(shape.text) + 1
+            if limit is not None and length >= limit:
+                break
+        return "\n".join(parts)
+
+
+def _extract_content(file_path, full_content):
+    """
+    Extraction switch for all supported file types. Returns the raw text,
+    or None for unsupported extensions; parse errors propagate to the caller.
     """
     _, extension = os.path.splitext(file_path)
     extension = extension.lower()
     content = ""
 
-    try:
-        # Handling for plain text and code files
-        if extension in ['.txt', '.md', '.py', '.java', '.js', '.html', '.css', '.json', '.xml', '.csv', '.log', '.ini', '.cfg', '.sh', '.bat']:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-        elif extension == '.pdf':
-            with fitz.open(file_path) as doc:
-                content = "".join(page.get_text() for page in doc)
-        elif extension == '.pptx':
-            prs = pptx.Presentation(file_path)
-            content = "\n".join([shape.text for slide in prs.slides for shape in slide.shapes if hasattr(shape, "text")])
-        elif extension in ['.xlsx', '.xls']:
+    # Handling for plain text and code files
+    if extension in ['.txt', '.md', '.py', '.java', '.js', '.html', '.css', '.json', '.xml', '.csv', '.log', '.ini', '.cfg', '.sh', '.bat']:
+        # In summary mode only the first 15000 chars survive truncation, so
+        # read just enough bytes to cover that instead of pulling and
+        # decoding the whole file. 32 KiB decodes to >=15000 chars for any
+        # realistic text encoding.
+        with open(file_path, 'rb') as f:
+            raw = f.read() if full_content else f.read(32768)
+        content = raw.decode('utf-8', 'ignore')
+    elif extension == '.pdf':
+        content = _extract_pdf(file_path, limit=None if full_content else _SUMMARY_CHAR_LIMIT)
+    elif extension == '.pptx':
+        content = _extract_pptx(file_path, limit=None if full_content else _SUMMARY_CHAR_LIMIT)
+    elif extension in ['.xlsx', '.xls']:
+        text_parts = []
+        if CalamineWorkbook is not None:
+            workbook = CalamineWorkbook.from_path(file_path)
+            for sheet_name in workbook.sheet_names:
+                for row in workbook.get_sheet_by_name(sheet_name).to_python():
+                    text_parts.append(" ".join([str(cell) for cell in row if cell is not None and cell != ""]))
+        else:
             workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
-            text_parts = []
             for sheet in workbook:
                 for row in sheet.iter_rows():
                     text_parts.append(" ".join([str(cell.value) for cell in row if cell.value is not None]))
-            content = "\n".join(text_parts)
-        elif extension == '.docx':
-            doc = docx.Document(file_path)
-            content = "\n".join([para.text for para in doc.paragraphs])
+        content = "\n".join(text_parts)
+    elif extension == '.docx':
+        doc = docx.Document(file_path)
+        text_parts, length = [], 0
+        for para in doc.paragraphs:
+            text_parts.append(para.text)
+            length += len(para.text) + 1
+            if not full_content and length >= _SUMMARY_CHAR_LIMIT:
+                break
+        content = "\n".join(text_parts)
+    else:
+        return None
+    return content
+
+
+@functools.lru_cache(maxsize=64)
+def _cached_full_text(file_path, mtime):
+    """
+    Full-text extraction memoized by (path, mtime) so repeated chat turns
+    about the same file reuse the already-extracted text. The mtime in the
+    key invalidates the entry when the file changes on disk.
+    """
+    return _extract_content(file_path, full_content=True)
+
+
+# Token budget for summary prompts. Chars are a poor proxy for tokens
+# (English under-fills, CJK overshoots), so when a tokenizer is available
+# we truncate on the actual token count the API bills and limits on.
+_SUMMARY_TOKEN_LIMIT = 4000
+
+
+@functools.lru_cache(maxsize=1)
+def _token_encoder():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # First use downloads the BPE file; on an offline machine this
+        # fails and we fall back to the character slice instead.
+        return None
+
+
+def _truncate_for_summary(text):
+    """Cut summary content at the token budget, or the char limit when no tokenizer is usable."""
+    encoder = _token_encoder()
+    if encoder is None:
+        return text[:_SUMMARY_CHAR_LIMIT]
+    tokens = encoder.encode(text)
+    if len(tokens) <= _SUMMARY_TOKEN_LIMIT:
+        return text
+    return encoder.decode(tokens[:_SUMMARY_TOKEN_LIMIT])
+
+
+def get_file_content(file_path, full_content=False):
+    """
+    Extracts text content from various file types.
+    Can be limited for initial summary or read fully for Q&A.
+    """
+    try:
+        if full_content:
+            content = _cached_full_text(file_path, os.path.getmtime(file_path))
         else:
-            return None, "Unsupported file type"
+            content = _extract_content(file_path, full_content=False)
     except Exception as e:
         return None, str(e)
-    
+
+    if content is None:
+        return None, "Unsupported file type"
     if full_content:
         return content, None
-    else:
-        # For initial summary, truncate to keep it free-tier friendly
-        return content[:15000], None
+    # For initial summary, truncate to keep it free-tier friendly
+    return _truncate_for_summary(content), None
 
 # --- Streamlit UI and Application Logic ---
 
@@ -259,7 +697,13 @@ if "scanned_files" not in st.session_state:
 with st.sidebar:
     st.header("⚙️ Settings")
     api_key = st.text_input("Enter your Google Gemini API Key", type="password", help="Your API key is required.")
+    if st.session_state.get("_last_api_key") != api_key:
+        # Drop responses cached under the previous key
+        _chat_response_cache().clear()
+        st.session_state._last_api_key = api_key
     path_input = st.text_input("Enter the full directory path", placeholder="e.g., C:\\Users\\YourUser\\Documents")
+    st.slider("Max concurrent API calls", 1, 16, _DEFAULT_API_CONCURRENCY, key="api_concurrency",
+              help="Lower this if you hit rate limits on the free tier.")
 
     if st.button("1. Scan & Summarize Directory", type="primary"):
         st.session_state.scanned_files = {}
@@ -286,46 +730,120 @@ if "path_input" in st.session_state and not st.session_state.scanned_files:
                      '.xml', '.csv', '.log', '.ini', '.cfg', '.sh', '.bat',
                      '.pdf', '.pptx', '.xlsx', '.xls', '.docx']
     
-    files_to_process = []
-    for root, _, files in os.walk(path):
-        for file_name in files:
-            if os.path.splitext(file_name)[1].lower() in supported_ext:
-                files_to_process.append((os.path.join(root, file_name), file_name))
+    files_to_process = discover_files(path, tuple(supported_ext))
 
     progress_bar = st.progress(0, text="Starting scan...")
 
-    for i, (file_path, file_name) in enumerate(files_to_process):
-        progress_text = f"Processing {i+1}/{len(files_to_process)}: {file_name}"
-        progress_bar.progress((i + 1) / len(files_to_process), text=progress_text)
-        
-        # Get truncated content for initial summary
-        content, error = get_file_content(file_path)
-        summary = "[Could not read file]"
-        
-        # FIX: Check if content is valid before making an API call
-        if not error and content and not content.isspace():
-            summary_prompt = f"Provide a concise, one-paragraph summary for a file named '{file_name}'. Focus on its main purpose and key topics.\n\n---\n\n{content}"
-            summary = make_api_call(api_key, summary_prompt)
-        elif not error:
-             summary = "[File is empty or contains no readable text]"
+    total = max(len(files_to_process), 1)
+
+    async def _scan_all(files):
+        done = 0
+        # to_thread uses the loop's default executor; cap it so at most 8
+        # files are being parsed off-thread alongside in-flight requests.
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=8))
+
+        def record(file_name, file_path, summary):
+            nonlocal done
+            st.session_state.scanned_files[file_name] = {
+                "path": file_path,
+                "summary": summary
+            }
+            done += 1
+            progress_bar.progress(done / total, text=f"Processed {done}/{total}: {file_name}")
+
+        async with httpx.AsyncClient(http2=True) as client:
+            sem = asyncio.Semaphore(st.session_state.get("api_concurrency", _DEFAULT_API_CONCURRENCY))
+
+            async def summarize_one(item):
+                file_name, file_path, content, cache_key = item
+                async with sem:
+                    summary_prompt = f"Provide a concise, one-paragraph summary for a file named '{file_name}'. Focus on its main purpose and key topics.\n\n---\n\n{content}"
+                    return [(file_name, file_path, cache_key, await make_api_call_async(client, api_key, summary_prompt))]
+
+            async def summarize_batch(batch):
+                async with sem:
+                    response = await make_api_call_async(client, api_key, _batch_prompt(batch), json_response=True)
+                try:
+                    summaries = _json_loads(response)
+                except ValueError:
+                    summaries = {}
+                if not isinstance(summaries, dict):
+                    summaries = {}
+                results = []
+                for item in batch:
+                    summary = summaries.get(item[0])
+                    if isinstance(summary, str) and summary.strip():
+                        results.append((item[0], item[1], item[3], summary.strip()))
+                    else:
+                        # The batch response missed or mangled this file;
+                        # fall back to an individual request for it.
+                        results.extend(await summarize_one(item))
+                return results
+
+            async def extract(file_path, file_name):
+                content, error = await asyncio.to_thread(get_file_content, file_path)
+                return file_name, file_path, content, error
+
+            # Extraction runs in worker threads while summary requests for
+            # already-extracted files are in flight. Large files dispatch
+            # their request immediately; small ones are grouped afterwards.
+            api_tasks = []
+            small_items = []
+            for extraction in asyncio.as_completed([extract(fp, fn) for fp, fn in files]):
+                file_name, file_path, content, error = await extraction
+                # FIX: Check if content is valid before making an API call
+                if error or not content or content.isspace():
+                    record(file_name, file_path, "[Could not read file]" if error else "[File is empty or contains no readable text]")
+                    continue
+                cache_key = _summary_cache_key(file_path)
+                if cache_key and (cached := _summary_cache().get(cache_key)) is not None:
+                    record(file_name, file_path, cached)
+                    continue
+                item = (file_name, file_path, content, cache_key)
+                if len(content) > _BATCH_BUDGET:
+                    api_tasks.append(asyncio.ensure_future(summarize_one(item)))
+                else:
+                    small_items.append(item)
 
+            batches, singles = _batch_small_files(small_items)
+            api_tasks += [asyncio.ensure_future(summarize_one(item)) for item in singles]
+            api_tasks += [asyncio.ensure_future(summarize_batch(batch)) for batch in batches]
+
+            for task in asyncio.as_completed(api_tasks):
+                for file_name, file_path, cache_key, summary in await task:
+                    # Don't cache error sentinels (API failures, missing key),
+                    # so those files are retried on the next scan
+                    if cache_key and not summary.startswith("["):
+                        _summary_cache().set(cache_key, summary)
+                    record(file_name, file_path, summary)
+
+    if files_to_process:
+        asyncio.run(_scan_all(files_to_process))
 
-        st.session_state.scanned_files[file_name] = {
-            "path": file_path,
-            "summary": summary
-        }
-    
     progress_bar.empty()
+    if st.session_state.scanned_files:
+        st.session_state.file_mention_re = _build_mention_re(st.session_state.scanned_files)
+        st.session_state.fname_lower, st.session_state.fname_multi = _build_mention_index(st.session_state.scanned_files)
     st.success("Scan complete! You can now ask questions below.")
 
 
+@st.fragment
+def render_summaries():
+    """
+    Render the per-file summary expanders. As a fragment, interacting with
+    this section re-runs only this function instead of the whole script
+    (sidebar, discovery, chat history and all).
+    """
+    for file_name, data in st.session_state.scanned_files.items():
+        with st.expander(f"📄 **{file_name}**"):
+            st.markdown(f"> {data['summary']}")
+
+
 # Display initial summaries if available
 if st.session_state.scanned_files:
     st.markdown("---")
     st.header("Initial Summaries")
-    for file_name, data in st.session_state.scanned_files.items():
-        with st.expander(f"📄 **{file_name}**"):
-            st.markdown(f"> {data['summary']}")
+    render_summaries()
 
     st.markdown("---")
     st.header("💬 Chat About Your Files")
@@ -345,13 +863,23 @@ if st.session_state.scanned_files:
             message_placeholder = st.empty()
             with st.spinner("Thinking..."):
                 # Check if the prompt mentions a specific file
+                if "file_mention_re" not in st.session_state:
+                    st.session_state.file_mention_re = _build_mention_re(st.session_state.scanned_files)
+                    st.session_state.fname_lower, st.session_state.fname_multi = _build_mention_index(st.session_state.scanned_files)
                 mentioned_file = None
-                for file_name in st.session_state.scanned_files.keys():
-                    if re.search(r'\b' + re.escape(file_name) + r'\b', prompt, re.IGNORECASE):
-                        mentioned_file = file_name
-                        break
+                # Cheap prefilter: most messages mention no file at all. A set
+                # intersection on the prompt's tokens settles that for plain
+                # filenames; names the tokenizer would split (e.g. containing
+                # spaces) get a substring check so they aren't missed.
+                prompt_lower = prompt.lower()
+                tokens = set(re.findall(r'[\w.\-]+', prompt_lower))
+                if (tokens & st.session_state.fname_lower.keys()
+                        or any(name in prompt_lower for name in st.session_state.fname_multi)):
+                    if match := st.session_state.file_mention_re.search(prompt):
+                        mentioned_file = st.session_state.fname_lower.get(match.group(1).lower())
                 
                 final_prompt = prompt
+                response = None
                 if mentioned_file:
                     file_path = st.session_state.scanned_files[mentioned_file]["path"]
                     
@@ -369,12 +897,26 @@ if st.session_state.scanned_files:
                                         f"And here is the FULL text content of the file named '{mentioned_file}':\n\n---\n\n"
                                         f"{full_content}\n\n---\n\n"
                                         f"Please answer the user's question based on the provided file content.")
-                        response = make_api_call(api_key, final_prompt)
+
+                if response is not None:
+                    # A read error was already formatted; nothing to stream
+                    message_placeholder.markdown(response)
+                elif (cached := _chat_response_cache().get((api_key, final_prompt))) is not None:
+                    # Identical prompt already answered; replay without an API call
+                    response = cached
+                    message_placeholder.markdown(response)
                 else:
-                    # General question, not about a specific file
-                    response = make_api_call(api_key, prompt)
-                
-                message_placeholder.markdown(response)
+                    # Render tokens as they arrive instead of waiting for
+                    # the complete response
+                    stream_status = {}
+                    response = message_placeholder.write_stream(make_api_call_stream(api_key, final_prompt, status=stream_status))
+                    # Only replay complete answers; a stream that died
+                    # mid-response must be retried, not cached
+                    if isinstance(response, str) and not stream_status.get('failed'):
+                        cache = _chat_response_cache()
+                        if len(cache) >= _CHAT_CACHE_MAX_ENTRIES:
+                            cache.pop(next(iter(cache)))
+                        cache[(api_key, final_prompt)] = response
         
         st.session_state.messages.append({"role": "assistant", "content": response})
 